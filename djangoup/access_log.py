@@ -0,0 +1,141 @@
+"""
+Module for parsing Gunicorn access logs.
+"""
+from collections import namedtuple
+from datetime import datetime
+import math
+import re
+
+# Matches the access_log_format of gunicorn.conf.py, where the last field is %(D)s.
+ACCESS_LOG_LINE_REGEX = re.compile(
+    r'^\S+ \S+ \S+ \[(?P<time>[^\]]+)\] "(?P<request>[^"]*)" (?P<status>\d{3}) .* (?P<duration>\d+)\s*$')
+ACCESS_LOG_TIME_FORMAT = '%d/%b/%Y:%H:%M:%S %z'
+# Path segments like ids or hashes are grouped on the same endpoint.
+PATH_ID_SEGMENT_REGEX = re.compile(r'^(\d+|[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}|[0-9a-f]{24,})$', re.I)
+
+# Endpoints over the limit and 4xx responses (scanners, probes) are grouped on one row.
+MAX_ENDPOINTS = 200
+OTHER_ENDPOINTS_NAME = '<other endpoints>'
+CLIENT_ERRORS_ENDPOINT_NAME = '<4xx responses>'
+CLIENT_ERROR_STATUS_RANGE = range(400, 500)
+
+AccessLogEntry = namedtuple('AccessLogEntry', ['timestamp', 'method', 'path', 'status', 'duration'])
+
+
+def parse_access_log_line(line):
+    """Parse a gunicorn access log line to AccessLogEntry or None if the line has no duration field."""
+    is_access_line = ACCESS_LOG_LINE_REGEX.match(line)
+    if not is_access_line:
+        return None
+
+    try:
+        timestamp = datetime.strptime(is_access_line.group('time'), ACCESS_LOG_TIME_FORMAT).timestamp()
+    except ValueError:
+        return None
+
+    request_parts = is_access_line.group('request').split(' ')
+    method = request_parts[0] if request_parts[0] else '-'
+    path = request_parts[1].split('?')[0] if len(request_parts) > 1 else '-'
+
+    return AccessLogEntry(
+        timestamp, method, path, int(is_access_line.group('status')), int(is_access_line.group('duration')))
+
+
+def get_endpoint_name(entry):
+    """Get endpoint name for an AccessLogEntry replacing ids on path with <id>."""
+    path_segments = ['<id>' if PATH_ID_SEGMENT_REGEX.match(segment) else segment for segment in entry.path.split('/')]
+    return '{} {}'.format(entry.method, '/'.join(path_segments))
+
+
+class LatencyHistogram:
+    """Log scale histogram for keeping latency percentiles in constant memory."""
+    bucket_growth = 1.02
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+
+    def add(self, duration):
+        """Add a duration in microseconds."""
+        bucket = int(math.log(max(duration, 1), self.bucket_growth))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+
+    def percentile(self, percent):
+        """Get the approximated percentile in microseconds (2% error at most)."""
+        if not self.count:
+            return 0
+
+        rank = math.ceil(self.count * percent / 100.0)
+        seen_count = 0
+        for bucket in sorted(self.buckets):
+            seen_count += self.buckets[bucket]
+            if seen_count >= rank:
+                return self.bucket_growth ** (bucket + 1)
+        return 0
+
+
+class LatencyStats:
+    """Request count, error count and latency histogram for a group of access log entries."""
+    server_error_status = 500
+
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.errors = 0
+
+    @property
+    def count(self):
+        return self.histogram.count
+
+    @property
+    def error_rate(self):
+        return self.errors / self.count if self.count else 0.0
+
+    def add(self, entry):
+        """Add an AccessLogEntry to the stats."""
+        self.histogram.add(entry.duration)
+        if entry.status >= self.server_error_status:
+            self.errors += 1
+
+    def percentile_ms(self, percent):
+        """Get a latency percentile in milliseconds."""
+        return self.histogram.percentile(percent) / 1000.0
+
+
+def collect_latency_stats(lines, since=None):
+    """Read access log lines one by one and return LatencyStats for entries after since timestamp."""
+    stats = LatencyStats()
+    for line in lines:
+        entry = parse_access_log_line(line)
+        if entry is None:
+            continue
+        if since is not None and entry.timestamp < since:
+            continue
+        stats.add(entry)
+    return stats
+
+
+def collect_endpoint_latency_stats(lines, split_at=None, max_endpoints=MAX_ENDPOINTS):
+    """Read access log lines one by one and return a dict of LatencyStats by endpoint for each time window.
+
+    Without split_at there is only one window. With split_at there are two windows: before and after it.
+    Each window keeps max_endpoints endpoints at most, the next ones are added to OTHER_ENDPOINTS_NAME.
+    """
+    windows = ({}, {}) if split_at is not None else ({},)
+    for line in lines:
+        entry = parse_access_log_line(line)
+        if entry is None:
+            continue
+
+        window = windows[1] if split_at is not None and entry.timestamp >= split_at else windows[0]
+        if entry.status in CLIENT_ERROR_STATUS_RANGE:
+            endpoint_name = CLIENT_ERRORS_ENDPOINT_NAME
+        else:
+            endpoint_name = get_endpoint_name(entry)
+
+        if endpoint_name not in window and len(window) >= max_endpoints:
+            endpoint_name = OTHER_ENDPOINTS_NAME
+        if endpoint_name not in window:
+            window[endpoint_name] = LatencyStats()
+        window[endpoint_name].add(entry)
+    return windows
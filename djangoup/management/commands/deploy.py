@@ -2,20 +2,34 @@
 Module for Deploy Commands.
 """
 from argparse import ArgumentParser
+import io
 import os
 import re
 import shutil
+from datetime import datetime
+import time
 
 from fabric2 import Connection
 from invoke import run as runcommand
+from paramiko.ssh_exception import SSHException
 import yaml
 
 from django.core.management.base import BaseCommand
 from django.conf import settings
 
+from djangoup.access_log import collect_endpoint_latency_stats, collect_latency_stats
+
 class Command(BaseCommand):
     """Command Class for Deploy Commands."""
     help = 'Deploy your Django Project'
+    canary_number_settings_defaults = {
+        'canary_duration': 300,
+        'canary_ready_timeout': 60,
+        'canary_min_requests': 100,
+        'canary_latency_percentile': 95,
+        'canary_max_latency_increase': 0.2,
+        'canary_max_error_rate_increase': 0.01,
+    }
 
     def add_arguments(self, parser: ArgumentParser):
         parser.add_argument(
@@ -30,14 +44,40 @@ class Command(BaseCommand):
             dest='build',
             help='Build files and dirs that are necessary for deploying project.')
 
+        parser.add_argument(
+            '--canary', '-c',
+            action='store_true',
+            dest='canary',
+            help='Deploy project as canary release and promote or abort it comparing latency with current release.')
+
+        parser.add_argument(
+            '--latency-report', '-l',
+            action='store_true',
+            dest='latency_report',
+            help='Show requests and latency percentiles by endpoint from gunicorn access log on server.')
+
+        parser.add_argument(
+            '--split-at',
+            dest='split_at',
+            help='Compare latency report before and after a time. Use last-deploy or YYYY-MM-DDTHH:MM:SS (local time).')
+
     def handle(self, *args, **options):
         project_root_path = settings.BASE_DIR
         current_dir_path = os.path.dirname(os.path.abspath(__file__))
 
+        if options['split_at'] and not options['latency_report']:
+            self.stdout.write('- --split-at only works with --latency-report')
+            self.stderr.write('Error on deploy command')
+            return
+
         if options['init']:
             self.handle_init_command(project_root_path, current_dir_path)
         elif options['build']:
             self.handle_build_project_for_deploy(project_root_path, current_dir_path)
+        elif options['canary']:
+            self.handle_deploy_project(project_root_path, canary=True)
+        elif options['latency_report']:
+            self.handle_latency_report(project_root_path, options['split_at'])
         else:
             self.handle_deploy_project(project_root_path)
 
@@ -98,12 +138,12 @@ class Command(BaseCommand):
 
         self.stdout.write(self.style.SUCCESS('Successfully Build files'))
 
-    def handle_deploy_project(self, project_root_path):
+    def handle_deploy_project(self, project_root_path, canary=False):
         """Handle deploy process when execute python manage.py deploy command."""
         error_on_deploy_project_message = 'Error on deploy project'
         self.stdout.write(self.style.WARNING('- Check stuffs for deploy'))
 
-        (checking_result_success, checking_message) = self.check_requirements_for_deploy(project_root_path)
+        (checking_result_success, checking_message) = self.check_requirements_for_deploy(project_root_path, canary)
         self.stdout.write(self.style.WARNING(checking_message))
         if not checking_result_success:
             self.stderr.write(error_on_deploy_project_message)
@@ -122,16 +162,155 @@ class Command(BaseCommand):
         server_user = deploy_settings.get('server_user')
         server_port = deploy_settings.get('server_ssh_port')
         server_connection = Connection(host=server_host, user=server_user, port=server_port)
-        success_server_build = self.build_server_structure(server_connection, deploy_settings)
+
+        if canary:
+            if not self.get_server_git_hash(server_connection, deploy_settings):
+                server_connection.close()
+                self.stdout.write(self.style.WARNING('- There is no release on server for comparing. Run python manage.py deploy first'))
+                self.stderr.write(error_on_deploy_project_message)
+                return
+
+            success_server_build = self.build_server_structure(
+                server_connection, self.get_canary_deploy_settings(deploy_settings), canary)
+        else:
+            success_server_build = self.build_server_structure(server_connection, deploy_settings)
         if not success_server_build:
             server_connection.close()
             self.stdout.write(self.style.WARNING('- Error on build server structure'))
             self.stderr.write(error_on_deploy_project_message)
             return
 
+        if canary:
+            success_canary_release = self.run_canary_release(server_connection, deploy_settings)
+            if not success_canary_release:
+                server_connection.close()
+                self.stdout.write(self.style.WARNING('- Canary release is not promoted'))
+                self.stderr.write(error_on_deploy_project_message)
+                return
+
         self.stdout.write(self.style.SUCCESS('Successfully Deploy'))
 
-    def check_requirements_for_deploy(self, project_root_path):
+    def handle_latency_report(self, project_root_path, split_at_option):
+        """Handle latency report when execute python manage.py deploy --latency-report command."""
+        error_on_latency_report_message = 'Error on latency report'
+
+        deploy_file_path = '{}/deploy.yml'.format(project_root_path)
+        if not os.path.isfile(deploy_file_path):
+            self.stdout.write('- deploy.yml is not created. You can use python manage.py deploy --init')
+            self.stderr.write(error_on_latency_report_message)
+            return
+
+        deploy_settings = self.get_deploy_yaml_config(project_root_path)
+        if not deploy_settings:
+            self.stdout.write('- deploy.yml is bad configured. Check the file please')
+            self.stderr.write(error_on_latency_report_message)
+            return
+
+        access_log_path = deploy_settings.get('gunicorn_access_log')
+        if not access_log_path or access_log_path == '-':
+            self.stdout.write('- gunicorn_access_log on deploy.yml needs to be the path of gunicorn access log on server')
+            self.stderr.write(error_on_latency_report_message)
+            return
+
+        server_host = deploy_settings.get('server_ip')
+        server_user = deploy_settings.get('server_user')
+        server_port = deploy_settings.get('server_ssh_port')
+        server_connection = Connection(host=server_host, user=server_user, port=server_port)
+
+        split_at = None
+        if split_at_option:
+            split_at = self.get_split_at_timestamp(server_connection, deploy_settings, split_at_option)
+            if split_at is None:
+                server_connection.close()
+                self.stdout.write('- --split-at needs to be last-deploy or YYYY-MM-DDTHH:MM:SS')
+                self.stderr.write(error_on_latency_report_message)
+                return
+
+        try:
+            access_log_lines = self.stream_server_file_lines(server_connection, access_log_path)
+            windows_stats = collect_endpoint_latency_stats(access_log_lines, split_at)
+        except IOError as read_error:
+            server_connection.close()
+            self.stdout.write('- {}'.format(read_error))
+            self.stderr.write(error_on_latency_report_message)
+            return
+        server_connection.close()
+
+        if split_at is None:
+            self.write_latency_report(windows_stats[0])
+        else:
+            self.write_latency_report_diff(windows_stats[0], windows_stats[1], split_at)
+
+    def get_split_at_timestamp(self, server_connection, deploy_settings, split_at_option):
+        """Get unix timestamp from --split-at option or None if it is not valid."""
+        last_deploy_option = 'last-deploy'
+        split_at_format = '%Y-%m-%dT%H:%M:%S'
+
+        if split_at_option == last_deploy_option:
+            pid_file_path = deploy_settings.get('gunicorn_pid_file')
+            pid_file_time_result = server_connection.run('stat -c %Y {}'.format(pid_file_path), hide=True, warn=True)
+            if pid_file_time_result.exited != 0:
+                self.stdout.write('- gunicorn pid file is not on server for getting last deploy time')
+                return None
+            return int(pid_file_time_result.stdout)
+
+        try:
+            return datetime.strptime(split_at_option, split_at_format).timestamp()
+        except ValueError:
+            return None
+
+    def write_latency_report(self, endpoints_stats):
+        """Write requests and latency percentiles by endpoint."""
+        row_pattern = '{:<60} {:>10} {:>10} {:>10} {:>10}'
+        self.stdout.write(row_pattern.format('Endpoint', 'Requests', 'p50 ms', 'p95 ms', 'p99 ms'))
+
+        for endpoint_name, stats in sorted(endpoints_stats.items(), key=lambda item: item[1].count, reverse=True):
+            self.stdout.write(row_pattern.format(
+                endpoint_name, stats.count, '{:.1f}'.format(stats.percentile_ms(50)),
+                '{:.1f}'.format(stats.percentile_ms(95)), '{:.1f}'.format(stats.percentile_ms(99))))
+
+    def write_latency_report_diff(self, before_endpoints_stats, after_endpoints_stats, split_at):
+        """Write requests and latency percentiles by endpoint before and after split time."""
+        row_pattern = '{:<60} {:>21} {:>24} {:>24} {:>24}'
+        self.stdout.write('- Before / after {}'.format(datetime.fromtimestamp(split_at).isoformat()))
+        self.stdout.write(row_pattern.format('Endpoint', 'Requests', 'p50 ms', 'p95 ms', 'p99 ms'))
+
+        endpoint_names = set(before_endpoints_stats) | set(after_endpoints_stats)
+        endpoint_requests = {
+            endpoint_name: self.get_endpoint_requests(before_endpoints_stats, endpoint_name) + self.get_endpoint_requests(after_endpoints_stats, endpoint_name)
+            for endpoint_name in endpoint_names}
+
+        for endpoint_name in sorted(endpoint_names, key=endpoint_requests.get, reverse=True):
+            before_stats = before_endpoints_stats.get(endpoint_name)
+            after_stats = after_endpoints_stats.get(endpoint_name)
+            requests_diff = '{} / {}'.format(
+                self.get_endpoint_requests(before_endpoints_stats, endpoint_name),
+                self.get_endpoint_requests(after_endpoints_stats, endpoint_name))
+            self.stdout.write(row_pattern.format(
+                endpoint_name, requests_diff,
+                self.format_percentile_diff(before_stats, after_stats, 50),
+                self.format_percentile_diff(before_stats, after_stats, 95),
+                self.format_percentile_diff(before_stats, after_stats, 99)))
+
+    @classmethod
+    def get_endpoint_requests(cls, endpoints_stats, endpoint_name):
+        """Get request count of an endpoint or 0 if it has no requests."""
+        stats = endpoints_stats.get(endpoint_name)
+        return stats.count if stats else 0
+
+    @classmethod
+    def format_percentile_diff(cls, before_stats, after_stats, percent):
+        """Format a latency percentile before and after with its change."""
+        if not before_stats or not after_stats:
+            before_latency = '{:.1f}'.format(before_stats.percentile_ms(percent)) if before_stats else '-'
+            after_latency = '{:.1f}'.format(after_stats.percentile_ms(percent)) if after_stats else '-'
+            return '{} / {}'.format(before_latency, after_latency)
+
+        before_latency = before_stats.percentile_ms(percent)
+        after_latency = after_stats.percentile_ms(percent)
+        return '{:.1f} / {:.1f} ({:+.0%})'.format(before_latency, after_latency, after_latency / before_latency - 1)
+
+    def check_requirements_for_deploy(self, project_root_path, canary=False):
         """Check all the requirements for execute a deploy."""
         deploy_file_path = '{}/deploy.yml'.format(project_root_path)
         if not os.path.isfile(deploy_file_path):
@@ -150,6 +329,26 @@ class Command(BaseCommand):
         if not os.path.exists(settings_folder_path):
             return False, '- settings folder is not created. You can use python manage.py deploy --build'
 
+        if canary:
+            canary_settings_names = [
+                'gunicorn_access_log', 'canary_bind', 'canary_pid_file', 'canary_access_log',
+                'canary_upstream_name', 'canary_upstream_file', 'canary_reload_command']
+            for canary_setting_name in canary_settings_names:
+                if not deploy_settings.get(canary_setting_name):
+                    return False, '- {} is not on deploy.yml. It is needed for canary deploy'.format(canary_setting_name)
+
+            traffic_percent = deploy_settings.get('canary_traffic_percent', 10)
+            if isinstance(traffic_percent, bool) or not isinstance(traffic_percent, int) or not 0 < traffic_percent < 100:
+                return False, '- canary_traffic_percent on deploy.yml needs to be an integer between 1 and 99'
+
+            for canary_setting_name, default_value in self.canary_number_settings_defaults.items():
+                setting_value = deploy_settings.get(canary_setting_name, default_value)
+                if isinstance(setting_value, bool) or not isinstance(setting_value, (int, float)) or setting_value < 0:
+                    return False, '- {} on deploy.yml needs to be a positive number'.format(canary_setting_name)
+
+            if not 0 < deploy_settings.get('canary_latency_percentile', 95) <= 100:
+                return False, '- canary_latency_percentile on deploy.yml needs to be between 1 and 100'
+
         return True, '- All your settings files are ready'
 
     @classmethod
@@ -162,7 +361,7 @@ class Command(BaseCommand):
         git_remote_hash = runcommand('git rev-parse {}/{}'.format(remote_name, branch))
         return git_local_hash.stdout == git_remote_hash.stdout
 
-    def build_server_structure(self, server_connection, deploy_settings):
+    def build_server_structure(self, server_connection, deploy_settings, canary=False):
         """Build a server structure for deploy."""
         success_build_folder = self.build_server_folders(server_connection, deploy_settings)
         if not success_build_folder:
@@ -185,12 +384,21 @@ class Command(BaseCommand):
         else:
             self.stdout.write(self.style.WARNING('- Project venv build successfully'))
 
-        success_migration_run = self.run_migrations(server_connection, deploy_settings)
-        if not success_migration_run:
-            self.stdout.write(self.style.WARNING('- Error running migrations on server'))
-            return False
+        if canary:
+            # Both releases share the database, so a canary can't change its schema.
+            no_pending_migrations = self.check_no_pending_migrations(server_connection, deploy_settings)
+            if not no_pending_migrations:
+                self.stdout.write(self.style.WARNING('- Canary release has pending migrations. Run python manage.py deploy instead'))
+                return False
+            else:
+                self.stdout.write(self.style.WARNING('- Canary release has no pending migrations'))
         else:
-            self.stdout.write(self.style.WARNING('- Run migrations on database successfully'))
+            success_migration_run = self.run_migrations(server_connection, deploy_settings)
+            if not success_migration_run:
+                self.stdout.write(self.style.WARNING('- Error running migrations on server'))
+                return False
+            else:
+                self.stdout.write(self.style.WARNING('- Run migrations on database successfully'))
 
         success_assets_collect = self.generate_assets_collect(server_connection, deploy_settings)
         if not success_assets_collect:
@@ -199,7 +407,10 @@ class Command(BaseCommand):
         else:
             self.stdout.write(self.style.WARNING('- Collect assets action successfully'))
 
-        success_gunicorn_service = self.run_gunicorn_service(server_connection, deploy_settings)
+        if canary:
+            success_gunicorn_service = self.run_canary_gunicorn_service(server_connection, deploy_settings)
+        else:
+            success_gunicorn_service = self.run_gunicorn_service(server_connection, deploy_settings)
         if not success_gunicorn_service:
             self.stdout.write(self.style.WARNING('- Error starting gunicorn service'))
             return False
@@ -284,6 +495,22 @@ class Command(BaseCommand):
 
         return True
 
+    @classmethod
+    def check_no_pending_migrations(cls, server_connection, deploy_settings):
+        """Check there are no unapplied migrations on server database for the project."""
+        venv_folder_path = deploy_settings.get('server_venv_path')
+        project_folder_path = deploy_settings.get('server_project_path')
+        project_name = deploy_settings.get('project_name')
+        successful_exit_code = 0
+        unapplied_migration_mark = '[ ]'
+
+        show_migrations_command = '{}/bin/python {}/manage.py showmigrations --plan --settings={}.settings'.format(venv_folder_path, project_folder_path, project_name)
+        show_migrations_result = server_connection.run(show_migrations_command, hide=True, warn=True)
+        if show_migrations_result.exited != successful_exit_code:
+            return False
+
+        return unapplied_migration_mark not in show_migrations_result.stdout
+
     @classmethod
     def generate_assets_collect(cls, server_connection, deploy_settings):
         """Collect all the assets file on static root folder."""
@@ -328,6 +555,262 @@ class Command(BaseCommand):
 
         return True
 
+    @classmethod
+    def run_canary_gunicorn_service(cls, server_connection, deploy_settings):
+        """Start gunicorn service for canary release next to the current one."""
+        venv_folder_path = deploy_settings.get('server_venv_path')
+        project_folder_path = deploy_settings.get('server_project_path')
+        gunicorn_config_path = '{}/{}'.format(project_folder_path, deploy_settings.get('gunicorn_config_file'))
+        successful_exit_code = 0
+
+        if not cls.stop_gunicorn_service(server_connection, deploy_settings.get('canary_pid_file')):
+            return False
+
+        project_wsgi_path = '{}.wsgi:application'.format(deploy_settings.get('project_name'))
+        init_gunicorn_service_command = 'cd {} && DJANGO_SETTINGS_MODULE={}.settings {}/bin/gunicorn -c {} --bind {} --pid {} --access-logfile {} {}'.format(
+            project_folder_path, deploy_settings.get('project_name'), venv_folder_path, gunicorn_config_path,
+            deploy_settings.get('canary_bind'), deploy_settings.get('canary_pid_file'),
+            deploy_settings.get('canary_access_log'), project_wsgi_path)
+
+        init_gunicorn_service_result = server_connection.run(init_gunicorn_service_command)
+        if init_gunicorn_service_result.exited != successful_exit_code:
+            return False
+
+        return True
+
+    @classmethod
+    def stop_gunicorn_service(cls, server_connection, pid_file_path):
+        """Stop gracefully a gunicorn service from its pid file."""
+        get_gunicorn_pid_command = '[ -f {0} ] && cat {0} || echo 0'.format(pid_file_path)
+        get_gunicorn_pid_result = server_connection.run(get_gunicorn_pid_command, hide=True)
+        gunicorn_pid_code = int(get_gunicorn_pid_result.stdout)
+        if gunicorn_pid_code != 0:
+            stop_gunicorn_service_command = 'kill -TERM {} && rm -f {}'.format(gunicorn_pid_code, pid_file_path)
+            stop_gunicorn_service_result = server_connection.run(stop_gunicorn_service_command, hide=True, warn=True)
+            if stop_gunicorn_service_result.exited != 0:
+                return False
+
+        return True
+
+    @classmethod
+    def get_server_git_hash(cls, server_connection, deploy_settings):
+        """Get the commit hash of the project on server or empty string if it is not cloned yet."""
+        project_folder_path = deploy_settings.get('server_project_path')
+        git_hash_command = 'cd {} && git rev-parse HEAD'.format(project_folder_path)
+
+        git_hash_result = server_connection.run(git_hash_command, hide=True, warn=True)
+        if git_hash_result.exited != 0:
+            return ''
+
+        return git_hash_result.stdout.strip()
+
+    @classmethod
+    def get_server_timestamp(cls, server_connection):
+        """Get current unix timestamp on server."""
+        server_timestamp_result = server_connection.run('date +%s', hide=True)
+        return int(server_timestamp_result.stdout)
+
+    @classmethod
+    def get_server_file_size(cls, server_connection, file_path):
+        """Get size in bytes of a file on server or 0 if it doesn't exist."""
+        file_size_result = server_connection.run('[ -f {0} ] && stat -c %s {0} || echo 0'.format(file_path), hide=True)
+        return int(file_size_result.stdout)
+
+    @classmethod
+    def stream_server_file_lines(cls, server_connection, file_path, offset=0):
+        """Read a file on server line by line from a byte offset without loading it on memory."""
+        server_connection.open()
+        _, remote_stdout, remote_stderr = server_connection.client.exec_command('tail -c +{} {}'.format(offset + 1, file_path))
+        try:
+            for line in remote_stdout:
+                yield line
+
+            if remote_stdout.channel.recv_exit_status() != 0:
+                raise IOError('Error reading {} on server: {}'.format(file_path, remote_stderr.read().decode().strip()))
+        finally:
+            remote_stdout.channel.close()
+
+    @classmethod
+    def get_canary_deploy_settings(cls, deploy_settings):
+        """Get deploy settings with the project and venv paths for canary release."""
+        canary_deploy_settings = dict(deploy_settings)
+        canary_deploy_settings['server_project_path'] = '{}.canary'.format(deploy_settings.get('server_project_path'))
+        canary_deploy_settings['server_venv_path'] = '{}.canary'.format(deploy_settings.get('server_venv_path'))
+        return canary_deploy_settings
+
+    def run_canary_release(self, server_connection, deploy_settings):
+        """Send traffic to canary release, compare it with current release and promote or abort it."""
+        stable_access_log_path = deploy_settings.get('gunicorn_access_log')
+        canary_access_log_path = deploy_settings.get('canary_access_log')
+        canary_start_timestamp = self.get_server_timestamp(server_connection)
+        stable_access_log_offset = self.get_server_file_size(server_connection, stable_access_log_path)
+        canary_access_log_offset = self.get_server_file_size(server_connection, canary_access_log_path)
+
+        if not self.wait_for_gunicorn_bind(server_connection, deploy_settings, deploy_settings.get('canary_bind')):
+            self.stdout.write(self.style.WARNING('- Canary release is not ready on {}'.format(deploy_settings.get('canary_bind'))))
+            self.abort_canary_release(server_connection, deploy_settings)
+            return False
+
+        traffic_percent = deploy_settings.get('canary_traffic_percent', 10)
+        success_traffic_shift = self.shift_traffic_to_canary(server_connection, deploy_settings, traffic_percent)
+        if not success_traffic_shift:
+            self.stdout.write(self.style.WARNING('- Error sending traffic to canary release'))
+            self.abort_canary_release(server_connection, deploy_settings)
+            return False
+
+        canary_duration = deploy_settings.get('canary_duration', 300)
+        self.stdout.write(self.style.WARNING('- Sending {}% of traffic to canary release for {} seconds'.format(
+            traffic_percent, canary_duration)))
+        time.sleep(canary_duration)
+
+        try:
+            stable_stats = collect_latency_stats(
+                self.stream_server_file_lines(server_connection, stable_access_log_path, stable_access_log_offset),
+                since=canary_start_timestamp)
+            canary_stats = collect_latency_stats(
+                self.stream_server_file_lines(server_connection, canary_access_log_path, canary_access_log_offset),
+                since=canary_start_timestamp)
+        except IOError as read_error:
+            self.stdout.write(self.style.WARNING('- {}'.format(read_error)))
+            self.abort_canary_release(server_connection, deploy_settings)
+            return False
+        self.write_release_stats('Current', stable_stats)
+        self.write_release_stats('Canary', canary_stats)
+
+        (canary_is_healthy, checking_message) = self.check_canary_thresholds(stable_stats, canary_stats, deploy_settings)
+        self.stdout.write(self.style.WARNING(checking_message))
+        if not canary_is_healthy:
+            self.abort_canary_release(server_connection, deploy_settings)
+            return False
+
+        success_promote = self.promote_canary_release(server_connection, deploy_settings)
+        if not success_promote:
+            self.stdout.write(self.style.WARNING('- Error promoting canary release'))
+            return False
+
+        self.stdout.write(self.style.WARNING('- Canary release promoted'))
+        return True
+
+    def write_release_stats(self, release_name, release_stats):
+        """Write request count, latency percentiles and error rate for a release."""
+        self.stdout.write('- {}: {} requests, p50 {:.1f}ms, p95 {:.1f}ms, p99 {:.1f}ms, errors {:.2%}'.format(
+            release_name, release_stats.count, release_stats.percentile_ms(50), release_stats.percentile_ms(95),
+            release_stats.percentile_ms(99), release_stats.error_rate))
+
+    @classmethod
+    def check_canary_thresholds(cls, stable_stats, canary_stats, deploy_settings):
+        """Check canary stats against thresholds on deploy.yml."""
+        min_requests = deploy_settings.get('canary_min_requests', 100)
+        latency_percentile = deploy_settings.get('canary_latency_percentile', 95)
+        max_latency_increase = deploy_settings.get('canary_max_latency_increase', 0.2)
+        max_error_rate_increase = deploy_settings.get('canary_max_error_rate_increase', 0.01)
+
+        if canary_stats.count < min_requests:
+            return False, '- Canary got {} requests, {} are required'.format(canary_stats.count, min_requests)
+
+        if stable_stats.count < min_requests:
+            return False, '- Current release got {} requests with duration on access log, {} are required'.format(
+                stable_stats.count, min_requests)
+
+        stable_latency = stable_stats.percentile_ms(latency_percentile)
+        canary_latency = canary_stats.percentile_ms(latency_percentile)
+        if canary_latency > stable_latency * (1 + max_latency_increase):
+            return False, '- Canary p{} latency {:.1f}ms is over the limit of current release {:.1f}ms'.format(
+                latency_percentile, canary_latency, stable_latency)
+
+        if canary_stats.error_rate > stable_stats.error_rate + max_error_rate_increase:
+            return False, '- Canary error rate {:.2%} is over the limit of current release {:.2%}'.format(
+                canary_stats.error_rate, stable_stats.error_rate)
+
+        return True, '- Canary release is within thresholds'
+
+    @classmethod
+    def generate_canary_upstream_config(cls, deploy_settings, traffic_percent):
+        """Generate nginx upstream with the share of traffic for canary release."""
+        stable_server = deploy_settings.get('gunicorn_bind')
+        canary_server = deploy_settings.get('canary_bind')
+        upstream_server_pattern = '    server {} weight={};\n'
+
+        if traffic_percent <= 0:
+            upstream_servers = '    server {};\n'.format(stable_server)
+        elif traffic_percent >= 100:
+            upstream_servers = '    server {};\n'.format(canary_server)
+        else:
+            upstream_servers = upstream_server_pattern.format(stable_server, 100 - traffic_percent)
+            upstream_servers += upstream_server_pattern.format(canary_server, traffic_percent)
+
+        return 'upstream {} {{\n{}}}\n'.format(deploy_settings.get('canary_upstream_name'), upstream_servers)
+
+    @classmethod
+    def shift_traffic_to_canary(cls, server_connection, deploy_settings, traffic_percent):
+        """Write nginx upstream with the share of traffic for canary release and reload nginx."""
+        upstream_config = cls.generate_canary_upstream_config(deploy_settings, traffic_percent)
+        successful_exit_code = 0
+        try:
+            server_connection.put(io.BytesIO(upstream_config.encode()), remote=deploy_settings.get('canary_upstream_file'))
+        except (IOError, SSHException):
+            return False
+
+        reload_result = server_connection.run(deploy_settings.get('canary_reload_command'), warn=True)
+        return reload_result.exited == successful_exit_code
+
+    def promote_canary_release(self, server_connection, deploy_settings):
+        """Update current release with the new code while canary gets all traffic, then stop canary release."""
+        if not self.shift_traffic_to_canary(server_connection, deploy_settings, 100):
+            self.abort_canary_release(server_connection, deploy_settings)
+            return False
+
+        canary_serving_all_traffic_message = '- Canary release is serving all traffic now. Fix the current release and run python manage.py deploy'
+        if not self.build_server_structure(server_connection, deploy_settings):
+            self.stdout.write(self.style.WARNING(canary_serving_all_traffic_message))
+            return False
+
+        if not self.wait_for_gunicorn_bind(server_connection, deploy_settings, deploy_settings.get('gunicorn_bind')):
+            self.stdout.write(self.style.WARNING('- Current release is not ready on {}'.format(deploy_settings.get('gunicorn_bind'))))
+            self.stdout.write(self.style.WARNING(canary_serving_all_traffic_message))
+            return False
+
+        if not self.shift_traffic_to_canary(server_connection, deploy_settings, 0):
+            self.stdout.write(self.style.WARNING(canary_serving_all_traffic_message))
+            return False
+
+        return self.stop_gunicorn_service(server_connection, deploy_settings.get('canary_pid_file'))
+
+    @classmethod
+    def check_gunicorn_bind_is_ready(cls, server_connection, deploy_settings, gunicorn_bind):
+        """Check gunicorn is accepting connections on its socket (unix:PATH or HOST:PORT)."""
+        venv_folder_path = deploy_settings.get('server_venv_path')
+        unix_socket_prefix = 'unix:'
+
+        if gunicorn_bind.startswith(unix_socket_prefix):
+            connect_code = "import socket; socket.socket(socket.AF_UNIX).connect('{}')".format(
+                gunicorn_bind[len(unix_socket_prefix):])
+        else:
+            (bind_host, _, bind_port) = gunicorn_bind.rpartition(':')
+            connect_code = "import socket; socket.create_connection(('{}', {}), 1)".format(bind_host, int(bind_port))
+
+        connect_result = server_connection.run('{}/bin/python -c "{}"'.format(venv_folder_path, connect_code), hide=True, warn=True)
+        return connect_result.exited == 0
+
+    def wait_for_gunicorn_bind(self, server_connection, deploy_settings, gunicorn_bind):
+        """Wait until gunicorn is ready on its socket or canary_ready_timeout seconds pass."""
+        ready_timeout = deploy_settings.get('canary_ready_timeout', 60)
+        check_interval = 1
+        waiting_deadline = time.time() + ready_timeout
+
+        while True:
+            if self.check_gunicorn_bind_is_ready(server_connection, deploy_settings, gunicorn_bind):
+                return True
+            if time.time() >= waiting_deadline:
+                return False
+            time.sleep(check_interval)
+
+    @classmethod
+    def abort_canary_release(cls, server_connection, deploy_settings):
+        """Send all traffic to current release and stop canary release."""
+        cls.shift_traffic_to_canary(server_connection, deploy_settings, 0)
+        cls.stop_gunicorn_service(server_connection, deploy_settings.get('canary_pid_file'))
+
     @classmethod
     def check_settings_folder_is_already_exist(cls, settings_folder_path):
         """Check if settings folder is already created."""
@@ -429,6 +912,9 @@ class Command(BaseCommand):
         workers_var_name = 'workers'
         worker_class_var_name = 'worker_class'
         pidfile_var_name = 'pidfile'
+        accesslog_var_name = 'accesslog'
+        preload_app_var_name = 'preload_app'
+        memory_report_requests_var_name = 'memory_report_requests'
 
         if var_pattern_name == bind_var_name:
             settings_value = "'{}'".format(deploy_settings.get('gunicorn_bind'))
@@ -438,6 +924,12 @@ class Command(BaseCommand):
             settings_value = "'{}'".format(deploy_settings.get('gunicorn_worker_class'))
         elif var_pattern_name == pidfile_var_name:
             settings_value = "'{}'".format(deploy_settings.get('gunicorn_pid_file'))
+        elif var_pattern_name == accesslog_var_name:
+            settings_value = "'{}'".format(deploy_settings.get('gunicorn_access_log', '-'))
+        elif var_pattern_name == preload_app_var_name:
+            settings_value = bool(deploy_settings.get('gunicorn_preload_app', False))
+        elif var_pattern_name == memory_report_requests_var_name:
+            settings_value = deploy_settings.get('gunicorn_memory_report_requests', 0)
         else:
             return processing_line
 
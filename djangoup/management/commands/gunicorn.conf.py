@@ -71,6 +71,34 @@ worker_connections = 1000
 timeout = 30
 keepalive = 2
 
+#
+# Memory sharing
+#
+#   preload_app - Load application code in the master process before
+#       forking the workers. Django setup, URLs and template loaders
+#       are warmed up in the master with gc disabled, and its objects
+#       are frozen with gc.freeze() before each fork. Workers enable gc
+#       again and share those memory pages (copy-on-write) instead of
+#       importing the project again.
+#
+#       True or False
+#
+#   memory_report_requests - Log unique (USS) and shared memory of
+#       each worker every this number of requests. Memory is always
+#       logged when a worker starts and exits.
+#
+#       A positive integer or 0 to only log on start and exit.
+#
+
+preload_app = False
+memory_report_requests = 0
+
+## with preload_app, avoid gc collections on the master leaving freed holes
+## on the pages shared with workers (enabled again on post_fork)
+if preload_app:
+    import gc
+    gc.disable()
+
 #
 #   spew - Install a trace function that spews every line of Python
 #       that is executed when running the server. This is the
@@ -140,11 +168,15 @@ tmp_upload_dir = None
 #
 #       A string of "debug", "info", "warning", "error", "critical"
 #
+#   access_log_format - The last field is the request time in
+#       microseconds (%(D)s). python manage.py deploy --canary
+#       reads it to compare latency between releases.
+#
 
 errorlog = '-'
 loglevel = 'info'
-accesslog = '-'
-access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"'
+accesslog = '/home/deploy/logs/project_name.access.log'
+access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s" %(D)s'
 
 #
 # Process naming
@@ -181,16 +213,70 @@ proc_name = None
 
 def post_fork(server, worker):
     server.log.info("Worker spawned (pid: %s)", worker.pid)
+    if preload_app:
+        import gc
+        gc.enable()
 
 def pre_fork(server, worker):
-    pass
+    ## keep cyclic gc from dirtying pages shared with the master (python >= 3.7)
+    import gc
+    if preload_app and hasattr(gc, 'freeze'):
+        gc.freeze()
 
 def pre_exec(server):
     server.log.info("Forked child, re-executing.")
 
 def when_ready(server):
+    if preload_app:
+        warm_up_django(server)
+        log_memory(server.log, server.pid, "master ready")
     server.log.info("Server is ready. Spawning workers")
 
+def post_worker_init(worker):
+    log_memory(worker.log, worker.pid, "worker ready")
+
+def post_request(worker, req, environ, resp):
+    if memory_report_requests and worker.nr % memory_report_requests == 0:
+        log_memory(worker.log, worker.pid, "after %s requests" % worker.nr)
+
+def worker_exit(server, worker):
+    log_memory(server.log, worker.pid, "worker exit")
+
+def warm_up_django(server):
+    from django.db import connections
+    from django.template import engines
+    from django.urls import get_resolver
+
+    ## import every urlconf and view module
+    get_resolver().reverse_dict
+    ## build template engines and loaders (only DjangoTemplates has loaders)
+    for engine in engines.all():
+        if hasattr(engine, 'engine'):
+            engine.engine.template_loaders
+    ## don't share database sockets with the workers
+    connections.close_all()
+    server.log.info("Django warmed up on master")
+
+def log_memory(log, pid, moment):
+    ## sizes in kB from /proc (Linux only)
+    memory = {'Private_Clean': 0, 'Private_Dirty': 0, 'Shared_Clean': 0, 'Shared_Dirty': 0, 'Pss': 0}
+    for smaps_path in ('/proc/%s/smaps_rollup' % pid, '/proc/%s/smaps' % pid):
+        try:
+            with open(smaps_path) as smaps:
+                for line in smaps:
+                    key, _, value = line.partition(':')
+                    if key in memory:
+                        memory[key] += int(value.split()[0])
+            break
+        except (IOError, OSError):
+            continue
+    else:
+        return
+
+    log.info("Memory %s (pid: %s): uss %s kB, shared %s kB, pss %s kB", moment, pid,
+        memory['Private_Clean'] + memory['Private_Dirty'],
+        memory['Shared_Clean'] + memory['Shared_Dirty'], memory['Pss'])
+
 def worker_int(worker):
     worker.log.info("worker received INT or QUIT signal")
 
@@ -1,3 +1,303 @@
-from django.test import TestCase
+import ast
+from io import StringIO
+import os
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from djangoup.access_log import (
+    CLIENT_ERRORS_ENDPOINT_NAME, OTHER_ENDPOINTS_NAME, LatencyHistogram, LatencyStats, collect_endpoint_latency_stats,
+    collect_latency_stats, get_endpoint_name, parse_access_log_line)
+from djangoup.management.commands.deploy import Command
+
+ACCESS_LOG_LINE = '127.0.0.1 - - [20/Nov/2018:18:30:00 +0000] "GET {} HTTP/1.1" {} 512 "-" "curl/7.58.0" {}\n'
+LEGACY_ACCESS_LOG_LINE = '127.0.0.1 - - [20/Nov/2018:18:30:00 +0000] "GET /api/users/ HTTP/1.1" 200 512 "-" "curl/7.58.0"\n'
+ACCESS_LOG_LINE_TIMESTAMP = 1542738600
+
+
+class AccessLogParseTests(SimpleTestCase):
+    """Tests for parsing gunicorn access log lines."""
+
+    def test_parse_line_with_duration(self):
+        entry = parse_access_log_line(ACCESS_LOG_LINE.format('/api/users/?page=2', 201, 15321))
+
+        self.assertEqual(entry.timestamp, ACCESS_LOG_LINE_TIMESTAMP)
+        self.assertEqual(entry.method, 'GET')
+        self.assertEqual(entry.path, '/api/users/')
+        self.assertEqual(entry.status, 201)
+        self.assertEqual(entry.duration, 15321)
+
+    def test_parse_legacy_line_without_duration(self):
+        self.assertIsNone(parse_access_log_line(LEGACY_ACCESS_LOG_LINE))
+
+    def test_parse_invalid_line(self):
+        self.assertIsNone(parse_access_log_line('[2018-11-20 18:30:00 +0000] [1234] [INFO] Booting worker\n'))
+
+    def test_endpoint_name_groups_ids(self):
+        numeric_id_entry = parse_access_log_line(ACCESS_LOG_LINE.format('/api/users/12/', 200, 1000))
+        uuid_entry = parse_access_log_line(
+            ACCESS_LOG_LINE.format('/api/orders/0f8fad5b-d9cb-469f-a165-70867728950e', 200, 1000))
+
+        self.assertEqual(get_endpoint_name(numeric_id_entry), 'GET /api/users/<id>/')
+        self.assertEqual(get_endpoint_name(uuid_entry), 'GET /api/orders/<id>')
+
+
+class LatencyStatsTests(SimpleTestCase):
+    """Tests for latency percentiles and stats from access log lines."""
+
+    def test_percentile_bounds(self):
+        histogram = LatencyHistogram()
+        for duration in range(1000, 101000, 1000):
+            histogram.add(duration)
+
+        for percent, exact_duration in ((50, 50000), (95, 95000), (99, 99000)):
+            self.assertGreaterEqual(histogram.percentile(percent), exact_duration)
+            self.assertLessEqual(histogram.percentile(percent), exact_duration * histogram.bucket_growth)
+
+    def test_percentile_without_entries(self):
+        self.assertEqual(LatencyHistogram().percentile(95), 0)
+
+    def test_collect_latency_stats(self):
+        lines = [
+            ACCESS_LOG_LINE.format('/api/users/', 200, 1000),
+            ACCESS_LOG_LINE.format('/api/users/', 502, 2000),
+            LEGACY_ACCESS_LOG_LINE,
+        ]
+        stats = collect_latency_stats(lines)
+
+        self.assertEqual(stats.count, 2)
+        self.assertEqual(stats.errors, 1)
+        self.assertEqual(stats.error_rate, 0.5)
+
+    def test_collect_latency_stats_since(self):
+        stats = collect_latency_stats(
+            [ACCESS_LOG_LINE.format('/api/users/', 200, 1000)], since=ACCESS_LOG_LINE_TIMESTAMP + 1)
+
+        self.assertEqual(stats.count, 0)
+
+    def test_collect_endpoint_latency_stats_split_at(self):
+        lines = [
+            ACCESS_LOG_LINE.format('/api/users/1/', 200, 1000),
+            ACCESS_LOG_LINE.format('/api/users/2/', 200, 1000),
+        ]
+        (before_stats, after_stats) = collect_endpoint_latency_stats(lines, split_at=ACCESS_LOG_LINE_TIMESTAMP + 1)
+
+        self.assertEqual(before_stats['GET /api/users/<id>/'].count, 2)
+        self.assertEqual(after_stats, {})
+
+
+def generate_latency_stats(requests_count, duration, errors_count=0):
+    """Generate LatencyStats with the same duration for all requests."""
+    stats = LatencyStats()
+    for request_number in range(requests_count):
+        status = 500 if request_number < errors_count else 200
+        stats.add(parse_access_log_line(ACCESS_LOG_LINE.format('/api/users/', status, duration)))
+    return stats
+
+
+class CanaryReleaseTests(SimpleTestCase):
+    """Tests for canary release thresholds and nginx upstream."""
+    deploy_settings = {
+        'gunicorn_bind': 'unix:/home/deploy/apps/project/project.sock',
+        'canary_bind': 'unix:/home/deploy/apps/project/project.canary.sock',
+        'canary_upstream_name': 'project',
+        'canary_min_requests': 100,
+        'canary_latency_percentile': 95,
+        'canary_max_latency_increase': 0.2,
+        'canary_max_error_rate_increase': 0.01,
+    }
+
+    def test_thresholds_canary_without_enough_requests(self):
+        (canary_is_healthy, _) = Command.check_canary_thresholds(
+            generate_latency_stats(100, 1000), generate_latency_stats(99, 1000), self.deploy_settings)
+
+        self.assertFalse(canary_is_healthy)
+
+    def test_thresholds_current_release_without_enough_requests(self):
+        (canary_is_healthy, _) = Command.check_canary_thresholds(
+            generate_latency_stats(0, 1000), generate_latency_stats(100, 1000), self.deploy_settings)
+
+        self.assertFalse(canary_is_healthy)
+
+    def test_thresholds_canary_over_latency_limit(self):
+        (canary_is_healthy, _) = Command.check_canary_thresholds(
+            generate_latency_stats(100, 1000), generate_latency_stats(100, 1300), self.deploy_settings)
+
+        self.assertFalse(canary_is_healthy)
+
+    def test_thresholds_canary_over_error_rate_limit(self):
+        (canary_is_healthy, _) = Command.check_canary_thresholds(
+            generate_latency_stats(100, 1000, errors_count=1), generate_latency_stats(100, 1000, errors_count=3),
+            self.deploy_settings)
+
+        self.assertFalse(canary_is_healthy)
+
+    def test_thresholds_canary_within_limits(self):
+        (canary_is_healthy, _) = Command.check_canary_thresholds(
+            generate_latency_stats(100, 1000, errors_count=1), generate_latency_stats(100, 1100, errors_count=2),
+            self.deploy_settings)
+
+        self.assertTrue(canary_is_healthy)
+
+    def test_upstream_without_canary_traffic(self):
+        self.assertEqual(
+            Command.generate_canary_upstream_config(self.deploy_settings, 0),
+            'upstream project {\n    server unix:/home/deploy/apps/project/project.sock;\n}\n')
+
+    def test_upstream_with_all_traffic_on_canary(self):
+        self.assertEqual(
+            Command.generate_canary_upstream_config(self.deploy_settings, 100),
+            'upstream project {\n    server unix:/home/deploy/apps/project/project.canary.sock;\n}\n')
+
+    def test_upstream_with_traffic_split(self):
+        self.assertEqual(
+            Command.generate_canary_upstream_config(self.deploy_settings, 10),
+            'upstream project {\n'
+            '    server unix:/home/deploy/apps/project/project.sock weight=90;\n'
+            '    server unix:/home/deploy/apps/project/project.canary.sock weight=10;\n'
+            '}\n')
+
+
+class FakeServerConnection:
+    """Server connection that answers commands with a fixed result and streams fixed lines."""
+
+    def __init__(self, exited=0, stdout='', lines=()):
+        self.exited = exited
+        self.stdout = stdout
+        self.lines = lines
+        self.channel = SimpleNamespace(closed=False, recv_exit_status=lambda: 0)
+        self.channel.close = lambda: setattr(self.channel, 'closed', True)
+        self.client = SimpleNamespace(exec_command=self.exec_command)
+
+    def run(self, command, **kwargs):
+        return SimpleNamespace(exited=self.exited, stdout=self.stdout)
+
+    def open(self):
+        pass
+
+    def exec_command(self, command):
+        return None, FakeRemoteFile(self.lines, self.channel), StringIO()
+
+
+class FakeRemoteFile:
+    """Remote file with lines and the channel of the command."""
+
+    def __init__(self, lines, channel):
+        self.lines = lines
+        self.channel = channel
+
+    def __iter__(self):
+        return iter(self.lines)
+
+
+class LatencyReportTests(SimpleTestCase):
+    """Tests for latency report by endpoint."""
+
+    def test_collect_endpoint_latency_stats_max_endpoints(self):
+        lines = [ACCESS_LOG_LINE.format('/blog/post-{}/'.format(post_number), 200, 1000) for post_number in range(10)]
+        (endpoints_stats,) = collect_endpoint_latency_stats(lines, max_endpoints=3)
+
+        self.assertEqual(len(endpoints_stats), 4)
+        self.assertEqual(endpoints_stats[OTHER_ENDPOINTS_NAME].count, 7)
+
+    def test_collect_endpoint_latency_stats_groups_client_errors(self):
+        lines = [
+            ACCESS_LOG_LINE.format('/wp-login.php', 404, 1000),
+            ACCESS_LOG_LINE.format('/.env', 404, 1000),
+            ACCESS_LOG_LINE.format('/api/users/', 403, 1000),
+        ]
+        (endpoints_stats,) = collect_endpoint_latency_stats(lines)
+
+        self.assertEqual(list(endpoints_stats), [CLIENT_ERRORS_ENDPOINT_NAME])
+        self.assertEqual(endpoints_stats[CLIENT_ERRORS_ENDPOINT_NAME].count, 3)
+
+    def test_split_at_with_date(self):
+        split_at = Command().get_split_at_timestamp(None, {}, '2018-11-20T18:30:00')
+
+        self.assertIsInstance(split_at, float)
+
+    def test_split_at_with_bad_input(self):
+        command = Command()
+
+        self.assertIsNone(command.get_split_at_timestamp(None, {}, '20/11/2018'))
+        self.assertIsNone(command.get_split_at_timestamp(None, {}, 'last-week'))
+
+    def test_split_at_with_last_deploy(self):
+        split_at = Command().get_split_at_timestamp(
+            FakeServerConnection(stdout='1542738600\n'), {'gunicorn_pid_file': '/tmp/project.pid'}, 'last-deploy')
+
+        self.assertEqual(split_at, 1542738600)
+
+    def test_split_at_with_last_deploy_without_pid_file(self):
+        split_at = Command(stdout=StringIO()).get_split_at_timestamp(
+            FakeServerConnection(exited=1), {'gunicorn_pid_file': '/tmp/project.pid'}, 'last-deploy')
+
+        self.assertIsNone(split_at)
+
+    def test_percentile_diff_on_both_windows(self):
+        self.assertEqual(
+            Command.format_percentile_diff(generate_latency_stats(1, 1000), generate_latency_stats(1, 2000), 50),
+            '1.0 / 2.0 (+100%)')
+
+    def test_percentile_diff_only_before(self):
+        self.assertEqual(Command.format_percentile_diff(generate_latency_stats(1, 1000), None, 50), '1.0 / -')
+
+    def test_percentile_diff_only_after(self):
+        self.assertEqual(Command.format_percentile_diff(None, generate_latency_stats(1, 2000), 50), '- / 2.0')
+
+    def test_stream_server_file_lines_closes_channel(self):
+        server_connection = FakeServerConnection(lines=['first\n', 'second\n'])
+        lines = Command.stream_server_file_lines(server_connection, '/tmp/project.access.log')
+        next(lines)
+        lines.close()
+
+        self.assertTrue(server_connection.channel.closed)
+
+
+class GunicornConfigTests(SimpleTestCase):
+    """Tests for generating gunicorn.conf.py from deploy.yml."""
+    deploy_settings = {
+        'gunicorn_bind': 'unix:/home/deploy/apps/project/project.sock',
+        'gunicorn_workers': 3,
+        'gunicorn_worker_class': 'sync',
+        'gunicorn_pid_file': '/home/deploy/apps/project/project.pid',
+        'gunicorn_access_log': '/home/deploy/apps/project/project.access.log',
+        'gunicorn_preload_app': True,
+        'gunicorn_memory_report_requests': 1000,
+    }
+
+    def generate_line(self, var_name, deploy_settings):
+        return Command.generate_line_for_replace_gunicorn_file(var_name, '{} = None\n'.format(var_name), deploy_settings)
+
+    def test_memory_sharing_lines_from_deploy_settings(self):
+        self.assertEqual(self.generate_line('preload_app', self.deploy_settings), 'preload_app = True\n')
+        self.assertEqual(self.generate_line('memory_report_requests', self.deploy_settings), 'memory_report_requests = 1000\n')
+        self.assertEqual(
+            self.generate_line('accesslog', self.deploy_settings),
+            "accesslog = '/home/deploy/apps/project/project.access.log'\n")
+
+    def test_memory_sharing_lines_without_deploy_settings(self):
+        self.assertEqual(self.generate_line('preload_app', {}), 'preload_app = False\n')
+        self.assertEqual(self.generate_line('memory_report_requests', {}), 'memory_report_requests = 0\n')
+        self.assertEqual(self.generate_line('accesslog', {}), "accesslog = '-'\n")
+
+    def test_preload_app_is_rendered_as_boolean(self):
+        self.assertEqual(self.generate_line('preload_app', {'gunicorn_preload_app': 'yes'}), 'preload_app = True\n')
+        self.assertEqual(self.generate_line('preload_app', {'gunicorn_preload_app': None}), 'preload_app = False\n')
+
+    def test_generated_config_file_is_valid_python(self):
+        current_dir_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'management', 'commands')
+        with TemporaryDirectory() as project_root_path:
+            Command().generate_gunicorn_config_file(self.deploy_settings, project_root_path, current_dir_path)
+            with open(os.path.join(project_root_path, 'gunicorn.conf.py')) as gunicorn_config_file:
+                gunicorn_config_tree = ast.parse(gunicorn_config_file.read())
+
+        config_values = {
+            node.targets[0].id: ast.literal_eval(node.value) for node in gunicorn_config_tree.body
+            if isinstance(node, ast.Assign) and isinstance(node.targets[0], ast.Name)}
+        self.assertEqual(config_values['bind'], self.deploy_settings['gunicorn_bind'])
+        self.assertEqual(config_values['workers'], 3)
+        self.assertIs(config_values['preload_app'], True)
+        self.assertEqual(config_values['memory_report_requests'], 1000)
+        self.assertEqual(config_values['accesslog'], self.deploy_settings['gunicorn_access_log'])